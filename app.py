@@ -1,13 +1,42 @@
-from flask import Flask, request, g
+from flask import Flask, Response, request, g, make_response, current_app, jsonify
+from flask.json.provider import JSONProvider
+from werkzeug.http import parse_etags
 from flask_restx import Api, Resource, fields, Namespace
-from data_store import get_all_posts, save_all_posts, get_all_users, save_all_users
+from data_store import (
+    get_all_posts, stream_all_posts, posts_version, get_post_by_id, add_post, allocate_post_id, update_post, delete_post,
+    upvote_post, downvote_post, mark_posts_dirty, search_posts,
+    get_all_users, get_user_by_name, add_user, allocate_user_id, mark_users_dirty,
+)
 from models import Post, User
+from fast_routes import FastRouter
+from encoders import compile_projection
 from datetime import datetime, timezone
 import hashlib
 import secrets
+import sys
+import threading
+import orjson
+from argon2 import PasswordHasher
+from cachetools import TTLCache
+from argon2.exceptions import InvalidHashError, VerificationError
 from functools import wraps
 
+class OrJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC)
+        return self._app.response_class(body, mimetype='application/json')
+
 app = Flask(__name__)
+app.json = OrJSONProvider(app)
 api = Api(app, 
     title='Blog Platform API',
     description='A simple blog platform backend with user authentication, posts, voting, and comments',
@@ -15,6 +44,16 @@ api = Api(app,
     doc='/docs/'
 )
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """Encode flask-restx responses with orjson instead of stdlib json"""
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_APPEND_NEWLINE
+    if current_app.debug:
+        option |= orjson.OPT_INDENT_2
+    resp = make_response(orjson.dumps(data, option=option), code)
+    resp.headers.extend(headers or {})
+    return resp
+
 # Namespaces
 auth_ns = Namespace('auth', description='Authentication operations')
 posts_ns = Namespace('posts', description='Blog posts operations')
@@ -72,17 +111,123 @@ vote_response = api.model('VoteResponse', {
     'downvotes': fields.Integer(description='Total downvotes')
 })
 
+# List endpoints bypass marshal_list_with (which walks every field of every
+# post reflectively) and serialize a projection generated from post_response
+# with orjson instead. The models above are still attached via @response for
+# the Swagger docs.
+project_post = compile_projection(post_response)
+
+def encode_posts(posts) -> bytes:
+    return orjson.dumps([project_post(p) for p in posts])
+
+# Encoded bodies of public post responses, valid for a single posts version
+# and served with a weak ETag naming that version so clients can revalidate.
+# The version counter restarts with every process, so the ETag also carries a
+# per-process nonce; otherwise a restarted (or another) worker could reuse an
+# ETag for different content.
+MAX_CACHED_RESPONSES = 256
+_ETAG_NONCE = secrets.token_hex(4)
+_response_cache = {}
+_response_cache_etag = None
+_response_cache_lock = threading.Lock()
+
+def posts_etag() -> str:
+    return f'{_ETAG_NONCE}-{posts_version()}'
+
+def cached_body(etag: str, key, build) -> bytes:
+    global _response_cache_etag
+    with _response_cache_lock:
+        if _response_cache_etag != etag:
+            _response_cache.clear()
+            _response_cache_etag = etag
+        body = _response_cache.get(key)
+    if body is None:
+        body = build()
+        with _response_cache_lock:
+            if _response_cache_etag == etag and len(_response_cache) < MAX_CACHED_RESPONSES:
+                _response_cache[key] = body
+    return body
+
+def cached_posts_response(key, build):
+    """Return a cached JSON body for key, or 304 if the client's ETag is current"""
+    etag = posts_etag()
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(cached_body(etag, key, build), mimetype='application/json')
+    resp.set_etag(etag, weak=True)
+    return resp
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def wants_ndjson() -> bool:
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def generate_ndjson(items):
+    for item in items:
+        yield orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)
+
+def ndjson_response(items):
+    """Stream items as newline-delimited JSON, one object per line"""
+    return Response(generate_ndjson(items), mimetype=NDJSON_MIMETYPE)
+
 # Authentication
-tokens = {}
+TOKEN_TTL = 3600  # seconds
+MAX_TOKENS = 10000
+# Least recently used tokens are evicted once MAX_TOKENS is reached and every
+# token expires after TOKEN_TTL. TTLCache is not thread-safe, hence the lock.
+tokens = TTLCache(maxsize=MAX_TOKENS, ttl=TOKEN_TTL)
+tokens_lock = threading.Lock()
+password_hasher = PasswordHasher()
+# Verified against when the username is unknown or the account still has a
+# legacy SHA-256 hash, so every login costs one argon2 verification and
+# response times don't reveal which usernames exist.
+_DUMMY_PASSWORD_HASH = password_hasher.hash(secrets.token_hex(16))
+
+def run_blocking(fn, *args):
+    """Call a CPU-bound function, off the event loop when running under gevent.
+
+    argon2 hashing takes ~100ms in C and would freeze every other greenlet of a
+    gevent worker; the hub's threadpool runs it on a native thread instead
+    (argon2-cffi releases the GIL while hashing).
+    """
+    if 'gevent' in sys.modules:
+        from gevent import get_hub, monkey
+        if monkey.is_module_patched('threading'):
+            return get_hub().threadpool.apply(fn, args)
+    return fn(*args)
 
 def hash_password(password: str) -> str:
+    return run_blocking(password_hasher.hash, password)
+
+def legacy_hash_password(password: str) -> str:
+    # Unsalted SHA-256 used by accounts created before argon2id
     return hashlib.sha256(password.encode()).hexdigest()
 
+def _argon2_check(password_hash: str, password: str) -> bool:
+    try:
+        return password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def _argon2_verify(password_hash: str, password: str) -> bool:
+    # Mismatches are caught inside the offloaded call, so the gevent
+    # threadpool never sees (and logs) them as failures
+    return run_blocking(_argon2_check, password_hash, password)
+
+def verify_password(password_hash: str, password: str) -> bool:
+    if password_hash.startswith('$argon2id$'):
+        return _argon2_verify(password_hash, password)
+    _argon2_verify(_DUMMY_PASSWORD_HASH, password)
+    return secrets.compare_digest(password_hash, legacy_hash_password(password))
+
 def generate_token() -> str:
     return secrets.token_hex(16)
 
 def authenticate(token: str):
-    return tokens.get(token)  # Returns {'user_id': int, 'role': str} or None
+    with tokens_lock:
+        return tokens.get(token)  # Returns {'user_id': int, 'role': str} or None
 
 def require_auth(f):
     @wraps(f)
@@ -128,7 +273,7 @@ class Register(Resource):
     def post(self):
         """Register a new user"""
         data = request.get_json()
-        if not data.get('username') or not data.get('password'):
+        if not (data.get('username') and data.get('password')):
             api.abort(400, 'Username and password required.')
         
         # Handle role assignment
@@ -140,15 +285,16 @@ class Register(Resource):
             if not auth_data or auth_data['role'] != 'moderator':
                 api.abort(403, 'Only moderators can create moderator accounts')
         
-        users = get_all_users()
-        if any(u['username'] == data['username'] for u in users):
+        # Cheap check before spending time on the password hash; add_user
+        # re-checks atomically in case of a concurrent registration
+        if get_user_by_name(data['username']):
             api.abort(400, 'Username already exists.')
         
-        user_id = (max([u['user_id'] for u in users]) + 1) if users else 1
+        user_id = allocate_user_id()
         password_hash = hash_password(data['password'])
         user = User(user_id, data['username'], password_hash, role)
-        users.append(user.to_dict())
-        save_all_users(users)
+        if not add_user(user.to_dict()):
+            api.abort(400, 'Username already exists.')
         return {'message': f'User registered successfully with role: {role}.'}, 201
 
 @auth_ns.route('/login')
@@ -158,29 +304,43 @@ class Login(Resource):
     def post(self):
         """Login and receive authentication token"""
         data = request.get_json()
-        if not data.get('username') or not data.get('password'):
+        if not (data.get('username') and data.get('password')):
             api.abort(400, 'Username and password required.')
         
-        users = get_all_users()
-        user = next((u for u in users if u['username'] == data['username']), None)
-        if not user or user['password_hash'] != hash_password(data['password']):
+        user = get_user_by_name(data['username'])
+        if not user:
+            _argon2_verify(_DUMMY_PASSWORD_HASH, data['password'])
+            api.abort(401, 'Invalid credentials.')
+        if not verify_password(user['password_hash'], data['password']):
             api.abort(401, 'Invalid credentials.')
         
+        # Upgrade legacy SHA-256 (or outdated argon2) hashes on successful login
+        if (not user['password_hash'].startswith('$argon2id$')
+                or password_hasher.check_needs_rehash(user['password_hash'])):
+            user['password_hash'] = hash_password(data['password'])
+            mark_users_dirty()
+        
         token = generate_token()
-        tokens[token] = {
-            'user_id': user['user_id'],
-            'role': user.get('role', 'user')  # Default to 'user' for existing users
-        }
+        with tokens_lock:
+            tokens[token] = {
+                'user_id': user['user_id'],
+                'role': user.get('role', 'user')  # Default to 'user' for existing users
+            }
         return {'token': token}
 
 # Posts endpoints
 @posts_ns.route('/')
 class PostsList(Resource):
-    @posts_ns.marshal_list_with(post_response)
+    @posts_ns.response(200, 'Success', [post_response])
     def get(self):
-        """Get all blog posts"""
-        posts = get_all_posts()
-        return posts
+        """Get all blog posts (send Accept: application/x-ndjson to stream them)"""
+        if wants_ndjson():
+            resp = ndjson_response(project_post(p) for p in stream_all_posts())
+        else:
+            resp = cached_posts_response('list', lambda: encode_posts(get_all_posts()))
+        # The representation depends on Accept, so shared caches must key on it
+        resp.vary.add('Accept')
+        return resp
 
     @posts_ns.expect(post_model)
     @posts_ns.marshal_with(post_response, code=201)
@@ -193,27 +353,27 @@ class PostsList(Resource):
         if error:
             api.abort(400, error)
         
-        posts = get_all_posts()
-        post_id = (max([p['post_id'] for p in posts]) + 1) if posts else 1
         publication_date = datetime.now(timezone.utc).isoformat()
-        post = Post(
-            post_id=post_id,
-            title=data['title'],
-            content=data['content'],
-            author_id=g.user_id,
-            publication_date=publication_date
-        )
-        posts.append(post.to_dict())
-        save_all_posts(posts)
-        return post.to_dict(), 201
+        # An id can be handed out twice if posts.json is reloaded between
+        # allocating and storing it; add_post refuses the duplicate, so retry
+        for _ in range(3):
+            post = Post(
+                post_id=allocate_post_id(),
+                title=data['title'],
+                content=data['content'],
+                author_id=g.user_id,
+                publication_date=publication_date
+            )
+            if add_post(post.to_dict()):
+                return post.to_dict(), 201
+        api.abort(500, 'Could not allocate a post id.')
 
 @posts_ns.route('/<int:post_id>')
 class PostDetail(Resource):
     @posts_ns.marshal_with(post_response)
     def get(self, post_id):
         """Get a specific blog post"""
-        posts = get_all_posts()
-        post = next((p for p in posts if p['post_id'] == post_id), None)
+        post = get_post_by_id(post_id)
         if not post:
             api.abort(404, 'Post not found')
         return post
@@ -225,74 +385,65 @@ class PostDetail(Resource):
     def put(self, post_id):
         """Update a blog post (authentication required, author only)"""
         data = request.get_json()
-        posts = get_all_posts()
-        idx = next((i for i, p in enumerate(posts) if p['post_id'] == post_id), None)
-        if idx is None:
+        post = get_post_by_id(post_id)
+        if not post:
             api.abort(404, 'Post not found')
         # Allow author or moderator to update
-        if not is_author_or_moderator(posts[idx]['author_id']):
+        if not is_author_or_moderator(post['author_id']):
             api.abort(403, 'Forbidden')
         
         error = Post.validate({**data, 'author_id': g.user_id})
         if error:
             api.abort(400, error)
         
-        posts[idx].update({
+        updated = update_post(post, {
             'title': data['title'],
             'content': data['content']
             # Keep original author_id - don't change ownership
         })
-        save_all_posts(posts)
-        return posts[idx]
+        if not updated:
+            # Deleted by a concurrent request after the lookup above
+            api.abort(404, 'Post not found')
+        return post
 
     @posts_ns.doc(security='apikey')
     @require_auth
     def delete(self, post_id):
         """Delete a blog post (authentication required, author only)"""
-        posts = get_all_posts()
-        idx = next((i for i, p in enumerate(posts) if p['post_id'] == post_id), None)
-        if idx is None:
+        post = get_post_by_id(post_id)
+        if not post:
             api.abort(404, 'Post not found')
         # Allow author or moderator to update
-        if not is_author_or_moderator(posts[idx]['author_id']):
+        if not is_author_or_moderator(post['author_id']):
             api.abort(403, 'Forbidden')
         
-        new_posts = [p for p in posts if p['post_id'] != post_id]
-        save_all_posts(new_posts)
+        delete_post(post_id)
         return '', 204
 
 @posts_ns.route('/<int:post_id>/upvote')
 class UpvotePost(Resource):
-    @posts_ns.marshal_with(api.model('UpvoteResponse', {'upvotes': fields.Integer()}))
+    @posts_ns.response(200, 'Success', api.model('UpvoteResponse', {'upvotes': fields.Integer()}))
     def post(self, post_id):
         """Upvote a blog post"""
-        posts = get_all_posts()
-        post = next((p for p in posts if p['post_id'] == post_id), None)
-        if not post:
+        upvotes = upvote_post(post_id)
+        if upvotes is None:
             api.abort(404, 'Post not found')
-        
-        post['upvotes'] = post.get('upvotes', 0) + 1
-        save_all_posts(posts)
-        return {'upvotes': post['upvotes']}
+        return {'upvotes': upvotes}, 200
 
 @posts_ns.route('/<int:post_id>/downvote')
 class DownvotePost(Resource):
-    @posts_ns.marshal_with(api.model('DownvoteResponse', {'downvotes': fields.Integer()}))
+    @posts_ns.response(200, 'Success', api.model('DownvoteResponse', {'downvotes': fields.Integer()}))
     def post(self, post_id):
         """Downvote a blog post"""
-        posts = get_all_posts()
-        post = next((p for p in posts if p['post_id'] == post_id), None)
-        if not post:
+        downvotes = downvote_post(post_id)
+        if downvotes is None:
             api.abort(404, 'Post not found')
-        
-        post['downvotes'] = post.get('downvotes', 0) + 1
-        save_all_posts(posts)
-        return {'downvotes': post['downvotes']}
+        return {'downvotes': downvotes}, 200
 
 @posts_ns.route('/<int:post_id>/comments')
 class PostComments(Resource):
     @posts_ns.expect(comment_model)
-    @posts_ns.marshal_with(api.model('CommentResponse', {'message': fields.String()}), code=201)
+    @posts_ns.response(201, 'Comment added', api.model('CommentResponse', {'message': fields.String()}))
     @posts_ns.doc(security='apikey')
     @require_auth
     def post(self, post_id):
@@ -301,8 +452,7 @@ class PostComments(Resource):
         if not data.get('content') or not isinstance(data['content'], str):
             api.abort(400, 'Content is required and must be a string.')
         
-        posts = get_all_posts()
-        post = next((p for p in posts if p['post_id'] == post_id), None)
+        post = get_post_by_id(post_id)
         if not post:
             api.abort(404, 'Post not found')
         
@@ -312,23 +462,27 @@ class PostComments(Resource):
             'timestamp': datetime.now(timezone.utc).isoformat()
         }
         post.setdefault('comments', []).append(comment)
-        save_all_posts(posts)
+        mark_posts_dirty()
         return {'message': 'Comment added.'}, 201
 
 # Search endpoint
 @search_ns.route('/')
 class SearchPosts(Resource):
-    @search_ns.marshal_list_with(post_response)
-    @search_ns.doc(params={'q': 'Search query'})
+    @search_ns.response(200, 'Success', [post_response])
+    @search_ns.doc(params={
+        'q': 'Search query',
+        'match': "'substring' (default) or 'word' to match whole words only"
+    })
     def get(self):
         """Search blog posts by title or content"""
-        query = request.args.get('q', '').lower()
+        query = request.args.get('q', '')
         if not query:
             api.abort(400, 'Query parameter q is required.')
         
-        posts = get_all_posts()
-        results = [p for p in posts if query in p['title'].lower() or query in p['content'].lower()]
-        return results
+        whole_word = request.args.get('match') == 'word'
+        return cached_posts_response(
+            ('search', query.lower(), whole_word),
+            lambda: encode_posts(search_posts(query, whole_word=whole_word)))
 
 
 # Moderator endpoints
@@ -350,8 +504,44 @@ class ModeratorPosts(Resource):
     @require_moderator
     def get(self):
         """Get all posts with moderation info (moderator only)"""
-        posts = get_all_posts()
-        return posts
+        if wants_ndjson():
+            resp = ndjson_response(stream_all_posts())
+        else:
+            resp = jsonify(get_all_posts())
+        resp.vary.add('Accept')
+        return resp
+
+# Fast paths for the hottest unauthenticated endpoints, dispatched by a
+# trie ahead of Werkzeug routing. The resources above remain the documented
+# (Swagger) definitions of these endpoints.
+def fast_get_post(environ, post_id):
+    etag = posts_etag()
+    post = get_post_by_id(post_id)
+    if not post:
+        return 404, {'message': 'Post not found'}
+    headers = [('ETag', f'W/"{etag}"')]
+    if parse_etags(environ.get('HTTP_IF_NONE_MATCH')).contains_weak(etag):
+        return 304, None, headers
+    body = cached_body(etag, ('post', post_id), lambda: orjson.dumps(project_post(post)))
+    return 200, body, headers
+
+def fast_upvote_post(environ, post_id):
+    upvotes = upvote_post(post_id)
+    if upvotes is None:
+        return 404, {'message': 'Post not found'}
+    return 200, {'upvotes': upvotes}
+
+def fast_downvote_post(environ, post_id):
+    downvotes = downvote_post(post_id)
+    if downvotes is None:
+        return 404, {'message': 'Post not found'}
+    return 200, {'downvotes': downvotes}
+
+fast_router = FastRouter(app.wsgi_app)
+fast_router.add('GET', '/posts/<int>', fast_get_post)
+fast_router.add('POST', '/posts/<int>/upvote', fast_upvote_post)
+fast_router.add('POST', '/posts/<int>/downvote', fast_downvote_post)
+app.wsgi_app = fast_router
 
 # Add security definitions
 api.authorizations = {
@@ -1,27 +1,270 @@
-import json
+import atexit
+import logging
+import os
+import re
+import tempfile
 import threading
-from typing import Any, Dict, List
+import time
+import ijson
+import orjson
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 USERS_FILE = 'users.json'
 POSTS_FILE = 'posts.json'
+VOTES_FILE = 'votes.json'
+
+logger = logging.getLogger(__name__)
+
+# Data files are written compactly; set BLOG_PRETTY_JSON=1 to get indented,
+# human-readable files when debugging.
+_DUMP_OPTION = orjson.OPT_NAIVE_UTC
+if os.environ.get('BLOG_PRETTY_JSON') == '1':
+    _DUMP_OPTION |= orjson.OPT_INDENT_2
 
 _data_locks = {
     USERS_FILE: threading.Lock(),
     POSTS_FILE: threading.Lock(),
 }
 
+# In-memory copies of the data files, kept fresh against the file's mtime.
+# Readers share the cached objects, so callers that mutate them must save
+# them or mark them dirty.
+_cache: Dict[str, Any] = {USERS_FILE: None, POSTS_FILE: None}
+_mtime: Dict[str, Any] = {}
+
+# Primary-key indices over the cached lists; the values are the same dicts
+# held in the lists, so in-place mutations are visible through both.
+_index_keys = {USERS_FILE: 'username', POSTS_FILE: 'post_id'}
+_indexes: Dict[str, Dict[Any, Dict]] = {USERS_FILE: {}, POSTS_FILE: {}}
+
+# Bumped on every change to a file's cached data, so callers can tell
+# whether anything derived from it (e.g. an encoded response) is stale.
+_versions: Dict[str, int] = {USERS_FILE: 0, POSTS_FILE: 0}
+
+# Next free numeric id per file, seeded from the data on load.
+_id_keys = {USERS_FILE: 'user_id', POSTS_FILE: 'post_id'}
+_next_ids: Dict[str, int] = {USERS_FILE: 1, POSTS_FILE: 1}
+
+# Search indices over the cached posts (never written to disk): the lowercased
+# (title, content) per post for substring search, and word -> post ids for
+# whole-word search.
+_WORD_RE = re.compile(r'\w+')
+_search_blobs: Dict[int, Tuple[str, str]] = {}
+_token_index: Dict[str, Set[int]] = {}
+
+# Vote counters live in a small sidecar file, {"<post_id>": [upvotes, downvotes]},
+# so a vote never rewrites posts.json. The counts are overlaid onto the cached
+# posts when they are loaded. Lock order: a _data_locks lock before _votes_lock.
+_votes: Optional[Dict[str, List[int]]] = None
+_votes_dirty = False
+_votes_lock = threading.Lock()
+
+# Small, frequent mutations (votes, comments) only mark the cached data dirty;
+# a background thread coalesces them into one file rewrite per FLUSH_INTERVAL.
+# Anything marked dirty but not yet flushed is lost if the process crashes.
+FLUSH_INTERVAL = 0.1
+FLUSH_RETRY_INTERVAL = 1.0
+_dirty: Dict[str, bool] = {USERS_FILE: False, POSTS_FILE: False}
+_flush_requested = threading.Event()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+def _file_mtime(filename: str):
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _set_cache(filename: str, data: Any) -> None:
+    key = _index_keys[filename]
+    id_key = _id_keys[filename]
+    _cache[filename] = data
+    _versions[filename] += 1
+    _indexes[filename] = {item[key]: item for item in data}
+    _next_ids[filename] = max((item[id_key] for item in data), default=0) + 1
+    if filename == POSTS_FILE:
+        _search_blobs.clear()
+        _token_index.clear()
+        with _votes_lock:
+            votes = _load_votes()
+            for post in data:
+                _index_post_text(post)
+                counts = votes.get(str(post['post_id']))
+                if counts is not None:
+                    post['upvotes'], post['downvotes'] = counts
+
+def _load_votes() -> Dict[str, List[int]]:
+    # Caller must hold _votes_lock.
+    global _votes
+    if _votes is None:
+        try:
+            with open(VOTES_FILE, 'rb') as f:
+                _votes = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            _votes = {}
+    return _votes
+
+def _vote(post_id: int, field: str) -> Optional[int]:
+    global _votes_dirty
+    with _data_locks[POSTS_FILE]:
+        _load_json_file(POSTS_FILE)
+        post = _indexes[POSTS_FILE].get(post_id)
+        if post is None:
+            return None
+        with _votes_lock:
+            counts = _load_votes().setdefault(
+                str(post_id), [post.get('upvotes', 0), post.get('downvotes', 0)])
+            counts[0 if field == 'upvotes' else 1] += 1
+            post['upvotes'], post['downvotes'] = counts
+            _votes_dirty = True
+        _versions[POSTS_FILE] += 1
+    _start_flusher()
+    _flush_requested.set()
+    return post[field]
+
+def _index_post_text(post: Dict) -> None:
+    post_id = post['post_id']
+    title, content = post['title'].lower(), post['content'].lower()
+    _search_blobs[post_id] = (title, content)
+    for token in _post_tokens(title, content):
+        _token_index.setdefault(token, set()).add(post_id)
+
+def _post_tokens(title: str, content: str) -> Set[str]:
+    return set(_WORD_RE.findall(title)) | set(_WORD_RE.findall(content))
+
+def _unindex_post_text(post_id: int) -> None:
+    fields = _search_blobs.pop(post_id, None)
+    if fields is None:
+        return
+    for token in _post_tokens(*fields):
+        ids = _token_index.get(token)
+        if ids is not None:
+            ids.discard(post_id)
+            if not ids:
+                del _token_index[token]
+
+def _cache_is_fresh(filename: str, mtime: Any) -> bool:
+    # Caller must hold _data_locks[filename].
+    if _dirty[filename]:
+        return True
+    return _cache[filename] is not None and _mtime.get(filename) == mtime
+
+def _load_json_file(filename: str) -> Any:
+    # Caller must hold _data_locks[filename].
+    mtime = _file_mtime(filename)
+    if _cache_is_fresh(filename, mtime):
+        return _cache[filename]
+    try:
+        with open(filename, 'rb') as f:
+            data = orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        data = []
+    _set_cache(filename, data)
+    _mtime[filename] = mtime
+    return data
+
 def _read_json_file(filename: str) -> Any:
     with _data_locks[filename]:
+        return _load_json_file(filename)
+
+def _atomic_write(filename: str, data: Any) -> None:
+    # Write to a temporary file next to the target and swap it into place, so
+    # a crash mid-write never leaves a truncated data file behind.
+    directory = os.path.dirname(os.path.abspath(filename))
+    with tempfile.NamedTemporaryFile('wb', dir=directory, prefix=f'.{os.path.basename(filename)}.',
+                                     delete=False) as tf:
         try:
-            with open(filename, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+            tf.write(orjson.dumps(data, option=_DUMP_OPTION))
+            tf.flush()
+            os.fsync(tf.fileno())
+            try:
+                os.chmod(tf.name, os.stat(filename).st_mode & 0o777)
+            except FileNotFoundError:
+                pass
+        except BaseException:
+            os.unlink(tf.name)
+            raise
+    os.replace(tf.name, filename)
+
+def _dump_json_file(filename: str) -> None:
+    # Caller must hold _data_locks[filename].
+    _atomic_write(filename, _cache[filename])
+    _mtime[filename] = _file_mtime(filename)
+    _dirty[filename] = False
 
 def _write_json_file(filename: str, data: Any) -> None:
     with _data_locks[filename]:
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        _set_cache(filename, data)
+        _dump_json_file(filename)
+
+def _lookup(filename: str, key: Any) -> Optional[Dict]:
+    with _data_locks[filename]:
+        _load_json_file(filename)
+        return _indexes[filename].get(key)
+
+def _append(filename: str, item: Dict) -> bool:
+    with _data_locks[filename]:
+        items = _load_json_file(filename)
+        key = item[_index_keys[filename]]
+        if key in _indexes[filename]:
+            return False
+        items.append(item)
+        _versions[filename] += 1
+        _indexes[filename][key] = item
+        _next_ids[filename] = max(_next_ids[filename], item[_id_keys[filename]] + 1)
+        if filename == POSTS_FILE:
+            _index_post_text(item)
+        _dump_json_file(filename)
+        return True
+
+def _allocate_id(filename: str) -> int:
+    with _data_locks[filename]:
+        _load_json_file(filename)
+        new_id = _next_ids[filename]
+        _next_ids[filename] = new_id + 1
+        return new_id
+
+def _flush_loop() -> None:
+    while True:
+        _flush_requested.wait()
+        time.sleep(FLUSH_INTERVAL)
+        _flush_requested.clear()
+        try:
+            flush_now()
+        except Exception:
+            # Keep the thread alive and retry; the data is still dirty in memory
+            logger.exception('Flushing data files failed; retrying in %.1fs', FLUSH_RETRY_INTERVAL)
+            time.sleep(FLUSH_RETRY_INTERVAL)
+            _flush_requested.set()
+
+def _start_flusher() -> None:
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='data-store-flusher', daemon=True)
+            _flusher.start()
+
+def _mark_dirty(filename: str) -> None:
+    with _data_locks[filename]:
+        _dirty[filename] = True
+        _versions[filename] += 1
+    _start_flusher()
+    _flush_requested.set()
+
+def flush_now() -> None:
+    """Write every dirty cached file to disk immediately."""
+    global _votes_dirty
+    for filename, lock in _data_locks.items():
+        with lock:
+            if _dirty[filename]:
+                _dump_json_file(filename)
+    with _votes_lock:
+        if _votes_dirty:
+            _atomic_write(VOTES_FILE, _votes)
+            _votes_dirty = False
+
+atexit.register(flush_now)
 
 def get_all_users() -> List[Dict]:
     return _read_json_file(USERS_FILE)
@@ -29,8 +272,130 @@ def get_all_users() -> List[Dict]:
 def save_all_users(users: List[Dict]) -> None:
     _write_json_file(USERS_FILE, users)
 
+def mark_users_dirty() -> None:
+    """Schedule the cached users (mutated in place) for a deferred write."""
+    _mark_dirty(USERS_FILE)
+
+def get_user_by_name(username: str) -> Optional[Dict]:
+    return _lookup(USERS_FILE, username)
+
+def add_user(user: Dict) -> bool:
+    """Append and persist a user. Returns False if the username is taken."""
+    return _append(USERS_FILE, user)
+
+def allocate_user_id() -> int:
+    return _allocate_id(USERS_FILE)
+
 def get_all_posts() -> List[Dict]:
     return _read_json_file(POSTS_FILE)
 
 def save_all_posts(posts: List[Dict]) -> None:
-    _write_json_file(POSTS_FILE, posts) 
\ No newline at end of file
+    _write_json_file(POSTS_FILE, posts)
+
+def stream_all_posts() -> Iterator[Dict]:
+    """Yield posts one at a time without loading the whole file.
+
+    Posts come from the cache when it is already loaded; otherwise posts.json
+    is parsed incrementally with ijson, and the cache is left untouched.
+    """
+    with _data_locks[POSTS_FILE]:
+        cached = None
+        if _cache_is_fresh(POSTS_FILE, _file_mtime(POSTS_FILE)):
+            cached = list(_cache[POSTS_FILE])
+    if cached is not None:
+        yield from cached
+        return
+    with _votes_lock:
+        votes = dict(_load_votes())
+    try:
+        f = open(POSTS_FILE, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        for post in ijson.items(f, 'item', use_float=True):
+            counts = votes.get(str(post['post_id']))
+            if counts is not None:
+                post['upvotes'], post['downvotes'] = counts
+            yield post
+
+def posts_version() -> int:
+    """Return a number that changes whenever any post changes."""
+    with _data_locks[POSTS_FILE]:
+        _load_json_file(POSTS_FILE)
+        return _versions[POSTS_FILE]
+
+def get_post_by_id(post_id: int) -> Optional[Dict]:
+    return _lookup(POSTS_FILE, post_id)
+
+def add_post(post: Dict) -> bool:
+    return _append(POSTS_FILE, post)
+
+def allocate_post_id() -> int:
+    return _allocate_id(POSTS_FILE)
+
+def upvote_post(post_id: int) -> Optional[int]:
+    """Record an upvote and return the new count, or None if the post is missing."""
+    return _vote(post_id, 'upvotes')
+
+def downvote_post(post_id: int) -> Optional[int]:
+    """Record a downvote and return the new count, or None if the post is missing."""
+    return _vote(post_id, 'downvotes')
+
+def update_post(post: Dict, changes: Dict) -> bool:
+    """Apply changes to a cached post, reindex it and schedule a write.
+
+    Returns False, changing nothing, if the post was deleted (or the cache
+    reloaded) since the caller looked it up.
+    """
+    with _data_locks[POSTS_FILE]:
+        _load_json_file(POSTS_FILE)
+        if _indexes[POSTS_FILE].get(post['post_id']) is not post:
+            return False
+        _unindex_post_text(post['post_id'])
+        post.update(changes)
+        _index_post_text(post)
+    mark_posts_dirty()
+    return True
+
+def delete_post(post_id: int) -> bool:
+    """Remove a post from the cache and schedule a write. Returns False if missing."""
+    global _votes_dirty
+    with _data_locks[POSTS_FILE]:
+        posts = _load_json_file(POSTS_FILE)
+        post = _indexes[POSTS_FILE].pop(post_id, None)
+        if post is None:
+            return False
+        # post_ids are unique, so equality only ever matches this dict
+        posts.pop(posts.index(post))
+        _unindex_post_text(post_id)
+        with _votes_lock:
+            if _load_votes().pop(str(post_id), None) is not None:
+                _votes_dirty = True
+    mark_posts_dirty()
+    return True
+
+def search_posts(query: str, whole_word: bool = False) -> List[Dict]:
+    """Return posts whose title or content contains query (case-insensitive).
+
+    With whole_word, every word in query must appear as a whole word.
+    """
+    query = query.lower()
+    with _data_locks[POSTS_FILE]:
+        posts = _load_json_file(POSTS_FILE)
+        if not whole_word:
+            results = []
+            for p in posts:
+                title, content = _search_blobs[p['post_id']]
+                if query in title or query in content:
+                    results.append(p)
+            return results
+        tokens = _WORD_RE.findall(query)
+        if not tokens:
+            return []
+        hits = set.intersection(*(_token_index.get(t, set()) for t in tokens))
+        index = _indexes[POSTS_FILE]
+        return [index[post_id] for post_id in sorted(hits) if post_id in index]
+
+def mark_posts_dirty() -> None:
+    """Schedule the cached posts (mutated in place) for a deferred write."""
+    _mark_dirty(POSTS_FILE)
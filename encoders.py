@@ -0,0 +1,38 @@
+from typing import Callable, Dict
+from flask_restx import fields, marshal
+
+# Field types whose marshalled output is the stored value itself (for data
+# already of the right type), so a projection can copy them straight across.
+_PASSTHROUGH_FIELDS = (fields.Integer, fields.String, fields.Raw)
+
+def _is_passthrough(field) -> bool:
+    if type(field) is fields.List:
+        return type(field.container) is fields.Raw and field.default is None
+    return (type(field) in _PASSTHROUGH_FIELDS
+            and field.default is None
+            and (field.attribute is None or isinstance(field.attribute, str)))
+
+def compile_projection(model) -> Callable[[Dict], Dict]:
+    """Build a function projecting a stored dict onto a flask-restx model.
+
+    The function is generated once, with one dict literal entry per model
+    field, so each call is a single expression with no per-field reflection.
+    Values are copied as stored rather than coerced. Models with fields that
+    need formatting, defaults, nesting or computed attributes fall back to
+    flask_restx.marshal.
+    """
+    schema = model.resolved
+    if not all(_is_passthrough(field) for field in schema.values()):
+        return lambda obj: marshal(obj, schema)
+    entries = ''.join(
+        f'        {name!r}: get({(field.attribute or name)!r}),\n'
+        for name, field in schema.items()
+    )
+    source = (
+        f'def project(obj):\n'
+        f'    get = obj.get\n'
+        f'    return {{\n{entries}    }}\n'
+    )
+    namespace = {}
+    exec(compile(source, f'<projection {model.name}>', 'exec'), namespace)
+    return namespace['project']
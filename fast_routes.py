@@ -0,0 +1,67 @@
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import orjson
+
+INT_SEGMENT = '<int>'
+# Non-string trie keys, so no request path segment can collide with them
+_INT_CHILD = int
+_HANDLER = None
+
+class FastRouter:
+    """WSGI middleware dispatching a small, fixed set of routes through a trie.
+
+    Paths are split on '/' and walked segment by segment through nested dicts,
+    so a match costs one dict probe per segment. Requests that do not match
+    fall through to the wrapped Flask app. Matched requests bypass Werkzeug
+    routing, Flask request hooks and flask-restx entirely, so only register
+    simple endpoints that need none of them.
+
+    Handlers are called as handler(environ, *int_segments) and return a
+    (status_code, payload) or (status_code, payload, headers) tuple. The
+    payload is encoded with orjson unless it is already bytes; None sends an
+    empty body.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._trie: Dict[str, Dict] = {}
+
+    def add(self, method: str, path: str, handler: Callable[..., Tuple[int, Any]]) -> None:
+        node = self._trie.setdefault(method, {})
+        for segment in path[1:].split('/'):
+            node = node.setdefault(_INT_CHILD if segment == INT_SEGMENT else segment, {})
+        node[_HANDLER] = handler
+
+    def match(self, method: str, path: str) -> Optional[Tuple[Callable, List[int]]]:
+        node = self._trie.get(method)
+        if node is None or not path.startswith('/'):
+            return None
+        args = []
+        for segment in path[1:].split('/'):
+            child = node.get(segment)
+            if child is None:
+                child = node.get(_INT_CHILD)
+                if child is None or not (segment.isascii() and segment.isdigit()):
+                    return None
+                args.append(int(segment))
+            node = child
+        handler = node.get(_HANDLER)
+        if handler is None:
+            return None
+        return handler, args
+
+    def __call__(self, environ, start_response):
+        matched = self.match(environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''))
+        if matched is None:
+            return self.wsgi_app(environ, start_response)
+        handler, args = matched
+        status, payload, *extra = handler(environ, *args)
+        headers = list(extra[0]) if extra else []
+        if payload is None:
+            body = b''
+        else:
+            body = payload if isinstance(payload, bytes) else orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE)
+            headers.append(('Content-Type', 'application/json'))
+        headers.append(('Content-Length', str(len(body))))
+        start_response(f'{status} {HTTPStatus(status).phrase}', headers)
+        return [body]
@@ -0,0 +1,21 @@
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# argon2 password hashing blocks for ~100ms per login/register; app.py runs
+# it on the gevent hub's threadpool (run_blocking) so it doesn't stall the
+# event loop serving every other connection.
+worker_class = 'gevent'
+worker_connections = 1000
+keepalive = 5
+
+# Auth tokens, the data cache and its write-behind flusher all live in the
+# worker process, so more than one worker would hand out tokens the others
+# reject and overwrite each other's writes. A single gevent worker still
+# serves many connections concurrently; only raise this once that state has
+# moved to a shared store.
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+
+def worker_exit(server, worker):
+    # Write out votes/comments still waiting for the background flusher
+    from data_store import flush_now
+    flush_now()
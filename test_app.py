@@ -1,7 +1,13 @@
 import unittest
-from app import app, tokens
+from unittest import mock
+from flask_restx import marshal
+from app import app, tokens, project_post, post_response
+import data_store
+from data_store import get_user_by_name
 import json
 import hashlib
+import secrets
+import time
 
 class BlogApiTestCase(unittest.TestCase):
     def setUp(self):
@@ -32,6 +38,24 @@ class BlogApiTestCase(unittest.TestCase):
         self.assertIsNotNone(token)
         return token
 
+    def test_password_stored_with_argon2(self):
+        """Test new passwords are hashed with argon2id, not SHA-256"""
+        self.test_register_and_login()
+        user = get_user_by_name('testuser')
+        self.assertTrue(user['password_hash'].startswith('$argon2id$'))
+        self.assertNotEqual(user['password_hash'], self.hash_password('testpass'))
+        # Wrong password is still rejected
+        resp = self.client.post('/auth/login', json={'username': 'testuser', 'password': 'wrong'})
+        self.assertEqual(resp.status_code, 401)
+
+    def test_unknown_user_login_runs_argon2(self):
+        """Test logins for unknown usernames still pay for an argon2 verification"""
+        import app as app_module
+        with mock.patch.object(app_module, 'password_hasher', wraps=app_module.password_hasher) as hasher:
+            resp = self.client.post('/auth/login', json={'username': 'no_such_user_x', 'password': 'pw'})
+        self.assertEqual(resp.status_code, 401)
+        hasher.verify.assert_called_once_with(app_module._DUMMY_PASSWORD_HASH, 'pw')
+
     def test_create_post(self):
         """Test creating a blog post"""
         token = self.test_register_and_login()
@@ -43,6 +67,19 @@ class BlogApiTestCase(unittest.TestCase):
         self.assertEqual(data['title'], 'Test Post')
         return data['post_id'], token
 
+    def test_create_post_retries_duplicate_id(self):
+        """Test an already-used post id is not reported as created"""
+        post_id, token = self.test_create_post()
+        # Simulate a stale counter handing out an id that is already stored
+        data_store._next_ids[data_store.POSTS_FILE] = post_id
+        resp = self.client.post('/posts/',
+            headers={'Authorization': token},
+            json={'title': 'Retry Post', 'content': 'Retry Content'})
+        self.assertEqual(resp.status_code, 201)
+        new_id = resp.get_json()['post_id']
+        self.assertNotEqual(new_id, post_id)
+        self.assertEqual(self.client.get(f'/posts/{new_id}').get_json()['title'], 'Retry Post')
+
     def test_upvote_post(self):
         """Test upvoting a post"""
         post_id, token = self.test_create_post()
@@ -52,6 +89,19 @@ class BlogApiTestCase(unittest.TestCase):
         self.assertIn('upvotes', resp.get_json())
         self.assertEqual(resp.get_json()['upvotes'], 1)
 
+    def test_downvote_post(self):
+        """Test downvoting a post is reflected when the post is read back"""
+        post_id, token = self.test_create_post()
+        resp = self.client.post(f'/posts/{post_id}/downvote')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['downvotes'], 1)
+        resp = self.client.get(f'/posts/{post_id}')
+        self.assertEqual(resp.get_json()['downvotes'], 1)
+        self.assertEqual(resp.get_json()['upvotes'], 0)
+        # Voting on a missing post
+        resp = self.client.post('/posts/999999/downvote')
+        self.assertEqual(resp.status_code, 404)
+
     def test_moderator_login(self):
         """Test moderator can login and access moderator endpoints"""
         # Login as admin moderator
@@ -67,6 +117,107 @@ class BlogApiTestCase(unittest.TestCase):
         self.assertIsInstance(users, list)
         return token
 
+    def test_etag_revalidation(self):
+        """Test unchanged posts are revalidated with 304 and changes invalidate the ETag"""
+        post_id, token = self.test_create_post()
+        for url in ('/posts/', f'/posts/{post_id}', '/search/?q=test'):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            etag = resp.headers['ETag']
+            resp = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp.data, b'')
+            
+            self.client.post(f'/posts/{post_id}/upvote')
+            resp = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotEqual(resp.headers['ETag'], etag)
+
+    def test_post_projection_matches_marshal(self):
+        """Test the generated post projection produces the same output as flask-restx"""
+        post_id, token = self.test_create_post()
+        for post in self.client.get('/posts/').get_json():
+            self.assertEqual(project_post(post), dict(marshal(post, post_response)))
+        self.assertEqual(project_post({'post_id': 1}), dict(marshal({'post_id': 1}, post_response)))
+
+    def test_flusher_survives_write_errors(self):
+        """Test a failed background flush is retried instead of killing the flusher"""
+        post_id, token = self.test_create_post()
+        real_atomic_write = data_store._atomic_write
+        failures = []
+        def failing_atomic_write(filename, data):
+            if not failures:
+                failures.append(filename)
+                raise OSError('disk full')
+            real_atomic_write(filename, data)
+        data_store._atomic_write = failing_atomic_write
+        try:
+            with self.assertLogs('data_store', level='ERROR'):
+                self.client.post(f'/posts/{post_id}/upvote')
+                deadline = time.time() + 5
+                while data_store._votes_dirty and time.time() < deadline:
+                    time.sleep(0.05)
+        finally:
+            data_store._atomic_write = real_atomic_write
+        self.assertEqual(len(failures), 1)
+        self.assertTrue(data_store._flusher.is_alive())
+        self.assertFalse(data_store._votes_dirty)
+
+    def test_etag_not_reused_after_restart(self):
+        """Test an ETag from a previous process is not answered with 304 after a reload"""
+        import app as app_module
+        post_id, token = self.test_create_post()
+        resp = self.client.get(f'/posts/{post_id}')
+        stale_etag = resp.headers['ETag']
+        version = data_store.posts_version()
+        self.client.post(f'/posts/{post_id}/upvote')
+        data_store.flush_now()
+        
+        # Simulate a fresh process whose version counter lands on the same value
+        app_module._ETAG_NONCE = secrets.token_hex(4)
+        data_store._cache[data_store.POSTS_FILE] = None
+        data_store._versions[data_store.POSTS_FILE] = version - 1
+        data_store._votes = None
+        self.assertEqual(data_store.posts_version(), version)
+        for url in ('/posts/', f'/posts/{post_id}'):
+            resp = self.client.get(url, headers={'If-None-Match': stale_etag})
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['upvotes'], 1)
+
+    def test_search_does_not_match_across_fields(self):
+        """Test substring search matches title and content separately"""
+        post_id, token = self.test_create_post()
+        resp = self.client.get('/search/?q=%00')
+        self.assertEqual(resp.get_json(), [])
+        # 'Test Post' + 'Test Content' must not match across the boundary
+        resp = self.client.get('/search/?q=post%00test')
+        self.assertEqual(resp.get_json(), [])
+        resp = self.client.get('/search/?q=posttest')
+        self.assertFalse(any(post['post_id'] == post_id for post in resp.get_json()))
+
+    def test_update_after_delete_is_rejected(self):
+        """Test an edit racing a delete neither succeeds nor revives the post in search"""
+        post_id, token = self.test_create_post()
+        post = data_store.get_post_by_id(post_id)
+        self.assertTrue(data_store.delete_post(post_id))
+        self.assertFalse(data_store.update_post(post, {'title': 'quokka', 'content': 'quokka'}))
+        self.assertEqual(data_store.search_posts('quokka', whole_word=True), [])
+        self.assertEqual(data_store.search_posts('quokka'), [])
+
+    def test_list_posts_ndjson(self):
+        """Test posts can be streamed as newline-delimited JSON"""
+        post_id, token = self.test_create_post()
+        resp = self.client.get('/posts/', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'application/x-ndjson')
+        posts = [json.loads(line) for line in resp.data.splitlines()]
+        self.assertTrue(any(post['post_id'] == post_id for post in posts))
+        self.assertIn('Accept', resp.vary)
+        
+        resp = self.client.get('/posts/')
+        self.assertEqual(resp.mimetype, 'application/json')
+        self.assertIn('Accept', resp.vary)
+
     def test_moderator_create_moderator(self):
         """Test that moderators can create other moderators"""
         admin_token = self.test_moderator_login()
@@ -150,5 +301,17 @@ class BlogApiTestCase(unittest.TestCase):
         self.assertIsInstance(results, list)
         self.assertTrue(any(post['title'] == 'Test Post' for post in results))
 
+    def test_search_whole_word(self):
+        """Test whole-word search only matches complete words"""
+        post_id, token = self.test_create_post()
+        
+        resp = self.client.get('/search/?q=test post&match=word')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(any(post['post_id'] == post_id for post in resp.get_json()))
+        
+        resp = self.client.get('/search/?q=tes&match=word')
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(any(post['post_id'] == post_id for post in resp.get_json()))
+
 if __name__ == '__main__':
     unittest.main()